@@ -0,0 +1,32 @@
+//-----------------------------------------------------------------------------
+// File: bp_gen.sv
+// Description: LFSR-driven backpressure generator for simulation. Deasserts
+//              ready on a pseudo-random subset of cycles so testbenches can
+//              inject downstream stalls without toggling ready from Python.
+//
+// Stall probability per cycle is rate/256; rate = 0 keeps ready high.
+//
+//-----------------------------------------------------------------------------
+
+module bp_gen (
+    input  logic        clk,
+    input  logic        rst_n,
+    input  logic [7:0]  rate,       // Stall probability (x/256)
+    input  logic [15:0] seed,       // LFSR seed, loaded during reset
+    output logic        ready
+);
+
+    // 16-bit maximal-length Fibonacci LFSR (taps 16,14,13,11)
+    logic [15:0] lfsr;
+
+    always_ff @(posedge clk or negedge rst_n) begin
+        if (!rst_n) begin
+            lfsr <= (seed == '0) ? 16'hACE1 : seed;   // All-zero state locks up
+        end else begin
+            lfsr <= {lfsr[14:0], lfsr[15] ^ lfsr[13] ^ lfsr[12] ^ lfsr[10]};
+        end
+    end
+
+    assign ready = (lfsr[7:0] >= rate);
+
+endmodule
@@ -0,0 +1,46 @@
+//-----------------------------------------------------------------------------
+// File: rst_gen.sv
+// Description: Re-triggerable reset sequencer for simulation. Every toggle of
+//              rst_req holds rst_n low for HOLD_CYCLES, then raises rst_done
+//              SETTLE_CYCLES after release, so a testbench can reset the DUT
+//              with one write and a single wait on rst_done.
+//
+//-----------------------------------------------------------------------------
+
+module rst_gen #(
+    parameter int unsigned HOLD_CYCLES   = 10,
+    parameter int unsigned SETTLE_CYCLES = 5
+) (
+    input  logic clk,
+    input  logic rst_req,       // Toggle to start a reset sequence
+    output logic rst_n,
+    output logic rst_done
+);
+
+    localparam int unsigned TOTAL_CYCLES = HOLD_CYCLES + SETTLE_CYCLES;
+    localparam int unsigned CNT_WIDTH    = $clog2(TOTAL_CYCLES + 1);
+
+    // Power up in reset so the DUT never sees X on rst_n
+    logic                 rst_req_q  = 1'b0;
+    logic [CNT_WIDTH-1:0] cnt        = '0;
+    logic                 rst_n_q    = 1'b0;
+    logic                 rst_done_q = 1'b0;
+
+    always_ff @(posedge clk) begin
+        rst_req_q <= rst_req;
+
+        if (rst_req != rst_req_q) begin
+            cnt        <= '0;
+            rst_n_q    <= 1'b0;
+            rst_done_q <= 1'b0;
+        end else if (!rst_done_q) begin
+            cnt <= cnt + 1'b1;
+            if (cnt == CNT_WIDTH'(HOLD_CYCLES - 1))  rst_n_q    <= 1'b1;
+            if (cnt == CNT_WIDTH'(TOTAL_CYCLES - 1)) rst_done_q <= 1'b1;
+        end
+    end
+
+    assign rst_n    = rst_n_q;
+    assign rst_done = rst_done_q;
+
+endmodule
@@ -0,0 +1,76 @@
+//-----------------------------------------------------------------------------
+// File: tb_book_tob.sv
+// Description: Simulation top for the book_tob cocotb testbench. Generates
+//              the 300 MHz core clock and reset sequence in HDL so the
+//              simulator does not call back into Python on every clock edge.
+//
+//-----------------------------------------------------------------------------
+
+`timescale 1ns/1ps
+
+import t2t_pkg::*;
+
+module tb_book_tob;
+
+    //=========================================================================
+    // Clock Generation (300 MHz)
+    //=========================================================================
+
+    logic clk = 1'b0;
+    always #1.665 clk = ~clk;
+
+    //=========================================================================
+    // Reset Generation
+    //=========================================================================
+
+    logic rst_req = 1'b0;       // Toggled from cocotb to request a reset
+    logic rst_n;
+    logic rst_done;
+
+    rst_gen u_rst_gen (
+        .clk      (clk),
+        .rst_req  (rst_req),
+        .rst_n    (rst_n),
+        .rst_done (rst_done)
+    );
+
+    //=========================================================================
+    // DUT Signals (driven / sampled from cocotb)
+    //=========================================================================
+
+    itch_msg_t              msg_in;
+    logic                   msg_valid;
+    logic                   msg_ready;
+
+    book_event_t            event_out;
+    logic                   event_valid;
+    logic                   event_ready;
+
+    logic                   cfg_enable;
+
+    logic [7:0]             bp_rate;        // Downstream stall rate (x/256)
+    logic [15:0]            bp_seed;
+
+    logic [31:0]            stat_updates;
+    logic [31:0]            stat_bank_conflicts;
+    logic [31:0]            stat_invalid_symbols;
+
+    //=========================================================================
+    // DUT
+    //=========================================================================
+
+    book_tob u_dut (.*);
+
+    //=========================================================================
+    // Downstream Backpressure
+    //=========================================================================
+
+    bp_gen u_bp_gen (
+        .clk    (clk),
+        .rst_n  (rst_n),
+        .rate   (bp_rate),
+        .seed   (bp_seed),
+        .ready  (event_ready)
+    );
+
+endmodule
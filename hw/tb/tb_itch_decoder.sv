@@ -0,0 +1,88 @@
+//-----------------------------------------------------------------------------
+// File: tb_itch_decoder.sv
+// Description: Simulation top for the itch_decoder cocotb testbench.
+//              Generates the 300 MHz core clock and reset sequence in HDL so
+//              the simulator does not call back into Python on every clock
+//              edge.
+//
+//-----------------------------------------------------------------------------
+
+`timescale 1ns/1ps
+
+import t2t_pkg::*;
+
+module tb_itch_decoder;
+
+    //=========================================================================
+    // Clock Generation (300 MHz)
+    //=========================================================================
+
+    logic clk = 1'b0;
+    always #1.665 clk = ~clk;
+
+    //=========================================================================
+    // Reset Generation
+    //=========================================================================
+
+    logic rst_req = 1'b0;       // Toggled from cocotb to request a reset
+    logic rst_n;
+    logic rst_done;
+
+    rst_gen u_rst_gen (
+        .clk      (clk),
+        .rst_req  (rst_req),
+        .rst_n    (rst_n),
+        .rst_done (rst_done)
+    );
+
+    //=========================================================================
+    // DUT Signals (driven / sampled from cocotb)
+    //=========================================================================
+
+    logic [511:0]           s_axis_tdata;
+    logic [7:0]             s_axis_tkeep;
+    logic                   s_axis_tlast;
+    logic [95:0]            s_axis_tuser;
+    logic                   s_axis_tvalid;
+    logic                   s_axis_tready;
+
+    itch_msg_t              decoded_msg;
+    logic                   decoded_valid;
+    logic                   decoded_ready;
+
+    logic [SYMBOL_KEY_WIDTH-1:0] sym_lookup_key;
+    logic                   sym_lookup_valid;
+    logic [SYMBOL_IDX_WIDTH-1:0] sym_lookup_idx;
+    logic                   sym_lookup_hit;
+    logic                   sym_lookup_ready;
+
+    logic [31:0]            stat_add_orders;
+    logic [31:0]            stat_executes;
+    logic [31:0]            stat_cancels;
+    logic [31:0]            stat_deletes;
+    logic [31:0]            stat_replaces;
+    logic [31:0]            stat_trades;
+    logic [31:0]            stat_unknown;
+
+    logic [7:0]             bp_rate;        // Downstream stall rate (x/256)
+    logic [15:0]            bp_seed;
+
+    //=========================================================================
+    // DUT
+    //=========================================================================
+
+    itch_decoder u_dut (.*);
+
+    //=========================================================================
+    // Downstream Backpressure
+    //=========================================================================
+
+    bp_gen u_bp_gen (
+        .clk    (clk),
+        .rst_n  (rst_n),
+        .rate   (bp_rate),
+        .seed   (bp_seed),
+        .ready  (decoded_ready)
+    );
+
+endmodule
@@ -6,11 +6,23 @@ using constrained-random stimulus and golden model comparison.
 """
 
 import cocotb
-from cocotb.clock import Clock
-from cocotb.triggers import RisingEdge, Timer, ClockCycles
+from cocotb.triggers import RisingEdge, Timer, First
 from cocotb.result import TestFailure
+from cocotb.binary import BinaryValue
 import random
-from collections import defaultdict
+import struct
+from collections import namedtuple
+import numpy as np
+
+# Core clock period generated by tb_book_tob.sv (300 MHz)
+CLK_PERIOD_PS = 3330
+
+# Simplified msg_in layout (adjust to match actual itch_msg_t), LSB first:
+#   [7:0] msg_type, [23:8] symbol_idx, [24] side, [63:32] price, [127:64] qty
+_MSG_IN_STRUCT = struct.Struct('<BHBIQ')
+
+
+TOB = namedtuple('TOB', ['bid', 'ask', 'last'])
 
 
 class BookGoldenModel:
@@ -18,79 +30,122 @@ class BookGoldenModel:
     
     def __init__(self, num_symbols=1024):
         self.num_symbols = num_symbols
-        # TOB state: {symbol_idx: {'bid': (price, qty), 'ask': (price, qty), 'last': price}}
-        self.tob = defaultdict(lambda: {
-            'bid': (0, 0),
-            'ask': (0, 0),
-            'last': 0
-        })
+        # TOB state as structure-of-arrays indexed by symbol_idx
+        self.bid_px = np.zeros(num_symbols, dtype=np.uint64)
+        self.bid_qty = np.zeros(num_symbols, dtype=np.uint64)
+        self.ask_px = np.zeros(num_symbols, dtype=np.uint64)
+        self.ask_qty = np.zeros(num_symbols, dtype=np.uint64)
+        self.last_px = np.zeros(num_symbols, dtype=np.uint64)
     
     def process_add_order(self, symbol_idx, side, price, qty):
         """Process an add order message"""
         if side == 'B':
-            curr_px, curr_qty = self.tob[symbol_idx]['bid']
+            curr_px = self.bid_px[symbol_idx]
             if price > curr_px:
-                self.tob[symbol_idx]['bid'] = (price, qty)
+                self.bid_px[symbol_idx] = price
+                self.bid_qty[symbol_idx] = qty
             elif price == curr_px:
-                self.tob[symbol_idx]['bid'] = (price, curr_qty + qty)
+                self.bid_qty[symbol_idx] += qty
         else:  # Ask
-            curr_px, curr_qty = self.tob[symbol_idx]['ask']
+            curr_px = self.ask_px[symbol_idx]
             if curr_px == 0 or price < curr_px:
-                self.tob[symbol_idx]['ask'] = (price, qty)
+                self.ask_px[symbol_idx] = price
+                self.ask_qty[symbol_idx] = qty
             elif price == curr_px:
-                self.tob[symbol_idx]['ask'] = (price, curr_qty + qty)
+                self.ask_qty[symbol_idx] += qty
     
     def process_trade(self, symbol_idx, price):
         """Process a trade message"""
-        self.tob[symbol_idx]['last'] = price
+        self.last_px[symbol_idx] = price
+    
+    def replay_batch(self, symbol_idx, is_bid, price, qty, is_trade=None):
+        """Apply a whole message sequence in one vectorized pass
+        
+        Takes aligned per-message arrays and gives the same final state as
+        calling process_add_order/process_trade in order, assuming non-zero
+        prices. Entries flagged in is_trade update only the last price.
+        """
+        symbol_idx = np.asarray(symbol_idx, dtype=np.intp)
+        is_bid = np.asarray(is_bid, dtype=bool)
+        price = np.asarray(price, dtype=np.uint64)
+        qty = np.asarray(qty, dtype=np.uint64)
+        is_trade = (np.zeros(len(symbol_idx), dtype=bool) if is_trade is None
+                    else np.asarray(is_trade, dtype=bool))
+        
+        # Bids: best price is the running max, qty sums orders at that price
+        bid = is_bid & ~is_trade
+        sym, px, q = symbol_idx[bid], price[bid], qty[bid]
+        best = self.bid_px.copy()
+        np.maximum.at(best, sym, px)
+        at_best = px == best[sym]
+        added = np.zeros(self.num_symbols, dtype=np.uint64)
+        np.add.at(added, sym[at_best], q[at_best])
+        self.bid_qty = np.where(best == self.bid_px, self.bid_qty, 0) + added
+        self.bid_px = best
+        
+        # Asks: same with a running min, where 0 means no ask yet
+        ask = ~is_bid & ~is_trade
+        sym, px, q = symbol_idx[ask], price[ask], qty[ask]
+        empty = np.iinfo(np.uint64).max
+        best = np.where(self.ask_px == 0, empty, self.ask_px).astype(np.uint64)
+        np.minimum.at(best, sym, px)
+        at_best = px == best[sym]
+        best[best == empty] = 0
+        added = np.zeros(self.num_symbols, dtype=np.uint64)
+        np.add.at(added, sym[at_best], q[at_best])
+        self.ask_qty = np.where(best == self.ask_px, self.ask_qty, 0) + added
+        self.ask_px = best
+        
+        # Trades: the last trade per symbol wins
+        rev_sym = symbol_idx[is_trade][::-1]
+        rev_px = price[is_trade][::-1]
+        syms, first = np.unique(rev_sym, return_index=True)
+        self.last_px[syms] = rev_px[first]
     
     def get_tob(self, symbol_idx):
         """Get current TOB state for a symbol"""
-        return self.tob[symbol_idx]
+        return TOB(
+            bid=(int(self.bid_px[symbol_idx]), int(self.bid_qty[symbol_idx])),
+            ask=(int(self.ask_px[symbol_idx]), int(self.ask_qty[symbol_idx])),
+            last=int(self.last_px[symbol_idx]),
+        )
 
 
 class BookTobTB:
     """Testbench driver for book_tob module"""
     
-    def __init__(self, dut):
-        self.dut = dut
-        self.clock = Clock(dut.clk, 3.33, units="ns")  # 300 MHz
-        cocotb.start_soon(self.clock.start())
+    def __init__(self, dut, inline_golden=True):
+        self.dut = dut  # clk is generated in HDL by tb_book_tob.sv
         self.golden = BookGoldenModel()
+        self.rng = random.Random(cocotb.RANDOM_SEED)  # Local, reproducible stream
+        # When False, tests replay stimulus through golden.replay_batch()
+        self.inline_golden = inline_golden
+        self._msg_in_bits = len(dut.msg_in)
         
         # Statistics
         self.messages_sent = 0
         self.events_received = 0
         self.errors = 0
     
-    async def reset(self):
-        """Reset the DUT"""
-        self.dut.rst_n.value = 0
+    async def reset(self, bp_rate=0):
+        """Reset the DUT
+        
+        bp_rate sets the HDL backpressure generator's per-cycle stall
+        probability (bp_rate/256) on event_ready; 0 keeps it always ready.
+        """
         self.dut.msg_valid.value = 0
-        self.dut.event_ready.value = 1
+        self.dut.bp_rate.value = bp_rate
+        self.dut.bp_seed.value = self.rng.getrandbits(16)
         self.dut.cfg_enable.value = 1
         
-        await ClockCycles(self.dut.clk, 10)
-        self.dut.rst_n.value = 1
-        await ClockCycles(self.dut.clk, 5)
-    
-    async def send_add_order(self, symbol_idx, side, price, qty, order_ref=None):
-        """Send an add order message to the book builder"""
-        if order_ref is None:
-            order_ref = random.randint(0, 2**64-1)
-        
-        # Update golden model
-        self.golden.process_add_order(symbol_idx, side, price, qty)
-        
-        # Pack message struct (simplified - adjust to match actual itch_msg_t)
-        # msg_type = 0x41 for Add Order
-        self.dut.msg_in.value = (
-            (0x41 << 0) |           # msg_type
-            (symbol_idx << 8) |     # symbol_idx
-            (1 if side == 'B' else 0) << 24 |  # side
-            (price << 32) |         # price
-            (qty << 64)             # qty
-        )
+        # rst_gen holds rst_n low for 10 cycles, then raises rst_done 5 later
+        self.dut.rst_req.value = self.dut.rst_req.value.integer ^ 1
+        await RisingEdge(self.dut.rst_done)
+    
+    async def _send_msg(self, msg_bytes):
+        """Present packed msg_in bytes with msg_valid and complete the handshake"""
+        msg = BinaryValue(value=msg_bytes, n_bits=self._msg_in_bits, bigEndian=False)
+        self.dut.msg_in.value = msg
         self.dut.msg_valid.value = 1
         
         await RisingEdge(self.dut.clk)
@@ -100,33 +155,41 @@ class BookTobTB:
         self.dut.msg_valid.value = 0
         self.messages_sent += 1
     
+    async def send_add_order(self, symbol_idx, side, price, qty, order_ref=None):
+        """Send an add order message to the book builder"""
+        if order_ref is None:
+            order_ref = self.rng.getrandbits(64)
+        
+        # Update golden model
+        if self.inline_golden:
+            self.golden.process_add_order(symbol_idx, side, price, qty)
+        
+        # msg_type = 0x41 for Add Order
+        await self._send_msg(_MSG_IN_STRUCT.pack(
+            0x41, symbol_idx, 1 if side == 'B' else 0, price, qty
+        ))
+    
     async def send_trade(self, symbol_idx, price, qty):
         """Send a trade message"""
-        self.golden.process_trade(symbol_idx, price)
+        if self.inline_golden:
+            self.golden.process_trade(symbol_idx, price)
         
         # msg_type = 0x50 for Trade
-        self.dut.msg_in.value = (
-            (0x50 << 0) |           # msg_type
-            (symbol_idx << 8) |     # symbol_idx
-            (price << 32) |         # price
-            (qty << 64)             # qty
-        )
-        self.dut.msg_valid.value = 1
-        
-        await RisingEdge(self.dut.clk)
-        while self.dut.msg_ready.value == 0:
-            await RisingEdge(self.dut.clk)
-        
-        self.dut.msg_valid.value = 0
-        self.messages_sent += 1
+        await self._send_msg(_MSG_IN_STRUCT.pack(0x50, symbol_idx, 0, price, qty))
     
     async def wait_for_event(self, timeout_cycles=100):
         """Wait for book event output"""
-        for _ in range(timeout_cycles):
-            await RisingEdge(self.dut.clk)
-            if self.dut.event_valid.value == 1:
-                self.events_received += 1
-                return True
+        await RisingEdge(self.dut.clk)
+        if self.dut.event_valid.value == 1:
+            self.events_received += 1
+            return True
+        
+        # Block on the valid edge itself instead of polling every clock
+        edge = RisingEdge(self.dut.event_valid)
+        fired = await First(edge, Timer(timeout_cycles * CLK_PERIOD_PS, units="ps"))
+        if fired is edge:
+            self.events_received += 1
+            return True
         return False
 
 
@@ -149,9 +212,9 @@ async def test_single_add_order(dut):
     
     # Verify golden model state
     tob = tb.golden.get_tob(0)
-    assert tob['bid'] == (15000, 100), f"Bid mismatch: {tob['bid']}"
+    assert tob.bid == (15000, 100), f"Bid mismatch: {tob.bid}"
     
-    dut._log.info(f"Single add order test passed: bid={tob['bid']}")
+    dut._log.info(f"Single add order test passed: bid={tob.bid}")
 
 
 @cocotb.test()
@@ -170,10 +233,10 @@ async def test_bid_ask_spread(dut):
     
     # Verify spread
     tob = tb.golden.get_tob(0)
-    spread = tob['ask'][0] - tob['bid'][0]
+    spread = tob.ask[0] - tob.bid[0]
     assert spread == 200, f"Spread mismatch: {spread}"
     
-    dut._log.info(f"Bid/ask spread test passed: bid={tob['bid']}, ask={tob['ask']}, spread={spread}")
+    dut._log.info(f"Bid/ask spread test passed: bid={tob.bid}, ask={tob.ask}, spread={spread}")
 
 
 @cocotb.test()
@@ -192,9 +255,9 @@ async def test_price_improvement(dut):
     
     # Verify TOB shows better price
     tob = tb.golden.get_tob(0)
-    assert tob['bid'][0] == 15000, f"Bid price not improved: {tob['bid']}"
+    assert tob.bid[0] == 15000, f"Bid price not improved: {tob.bid}"
     
-    dut._log.info(f"Price improvement test passed: bid={tob['bid']}")
+    dut._log.info(f"Price improvement test passed: bid={tob.bid}")
 
 
 @cocotb.test()
@@ -219,9 +282,9 @@ async def test_multiple_symbols(dut):
     for i in range(NUM_SYMBOLS):
         tob = tb.golden.get_tob(i)
         if i % 2 == 0:
-            assert tob['bid'][0] == 10000 + i * 100
+            assert tob.bid[0] == 10000 + i * 100
         else:
-            assert tob['ask'][0] == 10000 + i * 100
+            assert tob.ask[0] == 10000 + i * 100
     
     dut._log.info(f"Multi-symbol test passed: {NUM_SYMBOLS} symbols")
 
@@ -242,59 +305,67 @@ async def test_trade_last_price(dut):
     
     # Verify last trade price
     tob = tb.golden.get_tob(5)
-    assert tob['last'] == 15050, f"Last trade price mismatch: {tob['last']}"
+    assert tob.last == 15050, f"Last trade price mismatch: {tob.last}"
     
-    dut._log.info(f"Trade last price test passed: last={tob['last']}")
+    dut._log.info(f"Trade last price test passed: last={tob.last}")
 
 
 @cocotb.test()
 async def test_burst_orders(dut):
     """Test burst of orders for same symbol (hot symbol test)"""
-    tb = BookTobTB(dut)
-    await tb.reset()
+    tb = BookTobTB(dut, inline_golden=False)
+    await tb.reset(bp_rate=0x0E)  # Stall event_ready on ~5% of cycles
     
     HOT_SYMBOL = 42
     NUM_ORDERS = 50
     
+    idx = np.arange(NUM_ORDERS)
+    is_bid = idx % 2 == 0
+    prices = np.where(is_bid, 15000, 15100) + (idx % 10) * 10
+    qtys = np.array([tb.rng.randint(10, 1000) for _ in range(NUM_ORDERS)])
+    
     # Send many orders for same symbol (tests bank conflict handling)
-    for i in range(NUM_ORDERS):
-        side = 'B' if i % 2 == 0 else 'S'
-        price = 15000 + (i % 10) * 10 if side == 'B' else 15100 + (i % 10) * 10
-        
+    for bid, price, qty in zip(is_bid.tolist(), prices.tolist(), qtys.tolist()):
         await tb.send_add_order(
             symbol_idx=HOT_SYMBOL,
-            side=side,
+            side='B' if bid else 'S',
             price=price,
-            qty=random.randint(10, 1000)
+            qty=qty
         )
         
-        # Sometimes add backpressure
-        if i % 7 == 0:
-            tb.dut.event_ready.value = 0
-            await ClockCycles(tb.dut.clk, 3)
-            tb.dut.event_ready.value = 1
-        
         await tb.wait_for_event(timeout_cycles=50)
     
-    dut._log.info(f"Burst test passed: {NUM_ORDERS} orders, {tb.events_received} events")
+    tb.golden.replay_batch(np.full(NUM_ORDERS, HOT_SYMBOL), is_bid, prices, qtys)
+    tob = tb.golden.get_tob(HOT_SYMBOL)
+    assert tob.bid[0] == prices[is_bid].max(), f"Bid mismatch: {tob.bid}"
+    assert tob.ask[0] == prices[~is_bid].min(), f"Ask mismatch: {tob.ask}"
+    
+    dut._log.info(f"Burst test passed: {NUM_ORDERS} orders, {tb.events_received} events, "
+                  f"bid={tob.bid}, ask={tob.ask}")
     assert tb.events_received >= NUM_ORDERS * 0.9, "Too many events dropped"
 
 
 @cocotb.test()
 async def test_random_workload(dut):
     """Test with random order workload"""
-    tb = BookTobTB(dut)
+    tb = BookTobTB(dut, inline_golden=False)
     await tb.reset()
     
     NUM_ORDERS = 500
     
-    for i in range(NUM_ORDERS):
-        symbol_idx = random.randint(0, 255)  # Use subset of symbols
-        side = random.choice(['B', 'S'])
-        price = random.randint(1000, 100000)
-        qty = random.randint(1, 10000)
+    # Draw all stimulus up front so the send loop only indexes lists
+    rng = np.random.default_rng(cocotb.RANDOM_SEED)
+    syms = rng.integers(0, 256, NUM_ORDERS)  # Use subset of symbols
+    is_bid = rng.integers(0, 2, NUM_ORDERS) == 0
+    prices = rng.integers(1000, 100001, NUM_ORDERS)
+    qtys = rng.integers(1, 10001, NUM_ORDERS)
+    is_trades = rng.random(NUM_ORDERS) < 0.1
+    stimulus = zip(syms.tolist(), is_bid.tolist(), prices.tolist(), qtys.tolist(), is_trades.tolist())
+    
+    for symbol_idx, bid, price, qty, is_trade in stimulus:
+        side = 'B' if bid else 'S'
         
-        if random.random() < 0.1:
+        if is_trade:
             # 10% trades
             await tb.send_trade(symbol_idx, price, qty)
         else:
@@ -303,6 +374,21 @@ async def test_random_workload(dut):
         
         await tb.wait_for_event(timeout_cycles=30)
     
+    tb.golden.replay_batch(syms, is_bid, prices, qtys, is_trades)
+    
+    # Cross-check the batch replay against the per-message golden model
+    ref = BookGoldenModel()
+    for symbol_idx, bid, price, qty, is_trade in zip(syms.tolist(), is_bid.tolist(), prices.tolist(),
+                                                      qtys.tolist(), is_trades.tolist()):
+        if is_trade:
+            ref.process_trade(symbol_idx, price)
+        else:
+            ref.process_add_order(symbol_idx, 'B' if bid else 'S', price, qty)
+    
+    for symbol_idx in np.unique(syms).tolist():
+        tob, expected = tb.golden.get_tob(symbol_idx), ref.get_tob(symbol_idx)
+        assert tob == expected, f"Symbol {symbol_idx} TOB mismatch: batch={tob} per-message={expected}"
+    
     dut._log.info(f"Random workload test passed: sent={tb.messages_sent}, received={tb.events_received}")
 
 
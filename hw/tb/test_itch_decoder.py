@@ -6,11 +6,16 @@ using constrained-random stimulus.
 """
 
 import cocotb
-from cocotb.clock import Clock
-from cocotb.triggers import RisingEdge, Timer, ClockCycles
+from cocotb.triggers import RisingEdge, Timer, First
 from cocotb.result import TestFailure
+from cocotb.binary import BinaryValue
 import struct
 import random
+from functools import cached_property
+import numpy as np
+
+# Core clock period generated by tb_itch_decoder.sv (300 MHz)
+CLK_PERIOD_PS = 3330
 
 # ITCH message type codes
 ITCH_ADD_ORDER = 0x41      # 'A'
@@ -22,6 +27,16 @@ ITCH_ORDER_REPLACE = 0x55  # 'U'
 ITCH_TRADE = 0x50          # 'P'
 ITCH_SYSTEM_EVENT = 0x53   # 'S'
 
+# Prebuilt message layouts (big-endian)
+_ADD_STRUCT = struct.Struct('>cHHQQcI8sI')
+_EXEC_STRUCT = struct.Struct('>cHHQQIQ')
+_TRADE_STRUCT = struct.Struct('>cHHQQcI8sIQ')
+
+# TDATA width and TUSER layout, LSB first:
+#   [39:0] ingress_ts, [47:40] flags, [55:48] msg_len, [63:56] msg_type, [95:64] seq
+TDATA_BYTES = 64
+_TUSER_STRUCT = struct.Struct('<IBBBBI')
+
 
 class ITCHMessage:
     """Base class for ITCH messages"""
@@ -35,6 +50,21 @@ class ITCHMessage:
     def to_bytes(self):
         """Pack message to bytes (big-endian)"""
         raise NotImplementedError
+    
+    @cached_property
+    def data(self):
+        """Packed message bytes (memoized)"""
+        return self.to_bytes()
+    
+    @cached_property
+    def tdata(self):
+        """Message zero-padded to the 512-bit TDATA bus (memoized)"""
+        return BinaryValue(value=self.data.ljust(TDATA_BYTES, b'\x00'),
+                           n_bits=TDATA_BYTES * 8, bigEndian=False)
+    
+    def prepare(self):
+        """Pack the message now, filling the data/tdata caches; returns tdata"""
+        return self.tdata
 
 
 class AddOrderMessage(ITCHMessage):
@@ -49,7 +79,7 @@ class AddOrderMessage(ITCHMessage):
         self.price = price
     
     def to_bytes(self):
-        return struct.pack('>cHHQQcI8sI',
+        return _ADD_STRUCT.pack(
             bytes([self.msg_type]),
             self.stock_locate,
             self.tracking_num,
@@ -72,7 +102,7 @@ class OrderExecutedMessage(ITCHMessage):
         self.match_number = match_number
     
     def to_bytes(self):
-        return struct.pack('>cHHQQIQ',
+        return _EXEC_STRUCT.pack(
             bytes([self.msg_type]),
             self.stock_locate,
             self.tracking_num,
@@ -96,7 +126,7 @@ class TradeMessage(ITCHMessage):
         self.match_number = match_number
     
     def to_bytes(self):
-        return struct.pack('>cHHQQcI8sIQ',
+        return _TRADE_STRUCT.pack(
             bytes([self.msg_type]),
             self.stock_locate,
             self.tracking_num,
@@ -114,46 +144,47 @@ class ITCHDecoderTB:
     """Testbench driver for ITCH decoder"""
     
     def __init__(self, dut):
-        self.dut = dut
-        self.clock = Clock(dut.clk, 3.33, units="ns")  # 300 MHz
-        cocotb.start_soon(self.clock.start())
+        self.dut = dut  # clk is generated in HDL by tb_itch_decoder.sv
+        self.rng = random.Random(cocotb.RANDOM_SEED)  # Local, reproducible stream
         
         # Statistics
         self.messages_sent = 0
         self.messages_decoded = 0
         self.errors = 0
     
-    async def reset(self):
-        """Reset the DUT"""
-        self.dut.rst_n.value = 0
+    async def reset(self, bp_rate=0):
+        """Reset the DUT
+        
+        bp_rate sets the HDL backpressure generator's per-cycle stall
+        probability (bp_rate/256) on decoded_ready; 0 keeps it always ready.
+        """
         self.dut.s_axis_tvalid.value = 0
-        self.dut.decoded_ready.value = 1
+        self.dut.s_axis_tlast.value = 1  # One message per beat
+        self.dut.bp_rate.value = bp_rate
+        self.dut.bp_seed.value = self.rng.getrandbits(16)
         self.dut.sym_lookup_idx.value = 0
         self.dut.sym_lookup_hit.value = 1
         self.dut.sym_lookup_ready.value = 1
         
-        await ClockCycles(self.dut.clk, 10)
-        self.dut.rst_n.value = 1
-        await ClockCycles(self.dut.clk, 5)
+        # rst_gen holds rst_n low for 10 cycles, then raises rst_done 5 later
+        self.dut.rst_req.value = self.dut.rst_req.value.integer ^ 1
+        await RisingEdge(self.dut.rst_done)
     
     async def send_message(self, msg: ITCHMessage):
         """Send an ITCH message to the decoder"""
-        data = msg.to_bytes()
-        msg_len = len(data)
-        
-        # Pack message into 512-bit (64-byte) buffer
-        padded_data = data.ljust(64, b'\x00')
-        tdata = int.from_bytes(padded_data, 'little')
+        msg_len = len(msg.data)
         
         # Build TUSER: {seq, msg_type, msg_len, flags, ingress_ts}
-        seq = random.randint(1, 0xFFFFFFFF)
+        seq = self.rng.randint(1, 0xFFFFFFFF)
         flags = 0
-        ingress_ts = random.randint(0, 0xFFFFFFFFFFFFFFFF)
-        tuser = (seq << 64) | (msg.msg_type << 56) | (msg_len << 48) | (flags << 40) | (ingress_ts & 0xFFFFFFFFFF)
+        ingress_ts = self.rng.getrandbits(40)
+        tuser = BinaryValue(
+            value=_TUSER_STRUCT.pack(ingress_ts & 0xFFFFFFFF, ingress_ts >> 32,
+                                     flags, msg_len, msg.msg_type, seq),
+            n_bits=_TUSER_STRUCT.size * 8, bigEndian=False)
         
-        self.dut.s_axis_tdata.value = tdata
+        self.dut.s_axis_tdata.value = msg.tdata
         self.dut.s_axis_tkeep.value = msg_len
-        self.dut.s_axis_tlast.value = 1
         self.dut.s_axis_tuser.value = tuser
         self.dut.s_axis_tvalid.value = 1
         
@@ -166,11 +197,17 @@ class ITCHDecoderTB:
     
     async def wait_for_decoded(self, timeout_cycles=100):
         """Wait for decoded message output"""
-        for _ in range(timeout_cycles):
-            await RisingEdge(self.dut.clk)
-            if self.dut.decoded_valid.value == 1:
-                self.messages_decoded += 1
-                return True
+        await RisingEdge(self.dut.clk)
+        if self.dut.decoded_valid.value == 1:
+            self.messages_decoded += 1
+            return True
+        
+        # Block on the valid edge itself instead of polling every clock
+        edge = RisingEdge(self.dut.decoded_valid)
+        fired = await First(edge, Timer(timeout_cycles * CLK_PERIOD_PS, units="ps"))
+        if fired is edge:
+            self.messages_decoded += 1
+            return True
         return False
 
 
@@ -257,12 +294,13 @@ async def test_order_executed(dut):
 async def test_burst_messages(dut):
     """Test back-to-back message decoding"""
     tb = ITCHDecoderTB(dut)
-    await tb.reset()
+    await tb.reset(bp_rate=0x10)  # Stall decoded_ready on ~6% of cycles
     
     NUM_MESSAGES = 100
     
-    for i in range(NUM_MESSAGES):
-        msg = AddOrderMessage(
+    # Build stimulus up front so only signal driving happens between edges
+    msgs = [
+        AddOrderMessage(
             order_ref=i,
             side='B' if i % 2 == 0 else 'S',
             shares=100 * (i + 1),
@@ -272,14 +310,14 @@ async def test_burst_messages(dut):
             tracking_num=i,
             timestamp=i * 1000
         )
+        for i in range(NUM_MESSAGES)
+    ]
+    for msg in msgs:
+        msg.prepare()  # Pack now rather than inside the send loop
+    
+    for msg in msgs:
         await tb.send_message(msg)
         
-        # Wait for decode with backpressure sometimes
-        if i % 10 == 0:
-            tb.dut.decoded_ready.value = 0
-            await ClockCycles(tb.dut.clk, 5)
-            tb.dut.decoded_ready.value = 1
-        
         await tb.wait_for_decoded(timeout_cycles=50)
     
     dut._log.info(f"Burst test: sent={tb.messages_sent}, decoded={tb.messages_decoded}")
@@ -292,43 +330,49 @@ async def test_random_messages(dut):
     tb = ITCHDecoderTB(dut)
     await tb.reset()
     
+    rng = tb.rng
     message_types = [
         lambda i: AddOrderMessage(
-            order_ref=random.randint(0, 2**64-1),
-            side=random.choice(['B', 'S']),
-            shares=random.randint(1, 10000),
-            stock=f'RND{random.randint(0,9999):04d}',
-            price=random.randint(1, 1000000),
-            stock_locate=random.randint(0, 65535),
+            order_ref=rng.getrandbits(64),
+            side=rng.choice(['B', 'S']),
+            shares=rng.randint(1, 10000),
+            stock=f'RND{rng.randint(0,9999):04d}',
+            price=rng.randint(1, 1000000),
+            stock_locate=rng.randint(0, 65535),
             tracking_num=i,
-            timestamp=random.randint(0, 2**48-1)
+            timestamp=rng.randint(0, 2**48-1)
         ),
         lambda i: TradeMessage(
-            order_ref=random.randint(0, 2**64-1),
-            side=random.choice(['B', 'S']),
-            shares=random.randint(1, 10000),
-            stock=f'TRD{random.randint(0,9999):04d}',
-            price=random.randint(1, 1000000),
-            match_number=random.randint(0, 2**64-1),
-            stock_locate=random.randint(0, 65535),
+            order_ref=rng.getrandbits(64),
+            side=rng.choice(['B', 'S']),
+            shares=rng.randint(1, 10000),
+            stock=f'TRD{rng.randint(0,9999):04d}',
+            price=rng.randint(1, 1000000),
+            match_number=rng.getrandbits(64),
+            stock_locate=rng.randint(0, 65535),
             tracking_num=i,
-            timestamp=random.randint(0, 2**48-1)
+            timestamp=rng.randint(0, 2**48-1)
         ),
         lambda i: OrderExecutedMessage(
-            order_ref=random.randint(0, 2**64-1),
-            executed_shares=random.randint(1, 10000),
-            match_number=random.randint(0, 2**64-1),
-            stock_locate=random.randint(0, 65535),
+            order_ref=rng.getrandbits(64),
+            executed_shares=rng.randint(1, 10000),
+            match_number=rng.getrandbits(64),
+            stock_locate=rng.randint(0, 65535),
             tracking_num=i,
-            timestamp=random.randint(0, 2**48-1)
+            timestamp=rng.randint(0, 2**48-1)
         ),
     ]
     
     NUM_MESSAGES = 200
     
-    for i in range(NUM_MESSAGES):
-        msg_factory = random.choice(message_types)
-        msg = msg_factory(i)
+    # Build stimulus up front so only signal driving happens between edges
+    kind_rng = np.random.default_rng(cocotb.RANDOM_SEED)
+    kinds = kind_rng.integers(0, len(message_types), NUM_MESSAGES).tolist()
+    msgs = [message_types[kind](i) for i, kind in enumerate(kinds)]
+    for msg in msgs:
+        msg.prepare()  # Pack now rather than inside the send loop
+    
+    for msg in msgs:
         await tb.send_message(msg)
         await tb.wait_for_decoded(timeout_cycles=50)
     
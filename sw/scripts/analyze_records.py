@@ -5,65 +5,109 @@ Generates latency statistics and histograms
 """
 
 import sys
-import struct
+import json
 import numpy as np
 from pathlib import Path
 
+try:
+    from numba import njit, prange
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
 RECORD_SIZE = 64
-RECORD_FMT = '<IIQQHBBIIIIIIIHxxxxxx'
 
-def parse_record(data):
-    """Parse 64-byte record"""
-    fields = struct.unpack(RECORD_FMT, data)
-    return {
-        'seq': fields[0],
-        'ts_ingress': fields[2],
-        'ts_decode': fields[3],
-        'symbol_idx': fields[4],
-        'side': fields[5],
-        'flags': fields[6],
-        'quantity': fields[8],
-        'price': fields[9],
-        'ref_price': fields[10],
-        'feature0': fields[11],
-        'latency_ns': fields[3] - fields[2] if fields[3] > fields[2] else 0,
-        'is_stale': bool(fields[6] & 0x01),
-        'is_accepted': bool(fields[6] & 0x02),
-    }
+# Mirrors struct T2TRecord in sw/host/t2t_record.h
+RECORD_DTYPE = np.dtype([
+    ('seq',         '<u4'),
+    ('reserved0',   '<u4'),
+    ('ts_ingress',  '<u8'),
+    ('ts_decode',   '<u8'),
+    ('symbol_idx',  '<u2'),
+    ('side',        'u1'),
+    ('flags',       'u1'),
+    ('reserved1',   '<u4'),
+    ('quantity',    '<u4'),
+    ('price',       '<u4'),
+    ('ref_price',   '<u4'),
+    ('feature0',    '<u4'),
+    ('feature1',    '<u4'),
+    ('feature2',    '<u4'),
+    ('payload_crc', '<u2'),
+    ('reserved',    'V6'),
+])
+assert RECORD_DTYPE.itemsize == RECORD_SIZE
+
+FLAG_STALE  = 0x01
+FLAG_ACCEPT = 0x02
+
+PERCENTILES = [10, 25, 50, 75, 90, 99, 99.9]
+
+if HAVE_NUMBA:
+    @njit(parallel=True, cache=True)  # Reuse compiled kernel across runs
+    def summarize(ts_decode, ts_ingress, flags):
+        """Single pass: latency column (clamped at 0) plus accepted/stale counts"""
+        n = flags.shape[0]
+        lat = np.empty(n, dtype=np.uint64)
+        accepted = 0
+        stale = 0
+        for i in prange(n):
+            dec = ts_decode[i]
+            ing = ts_ingress[i]
+            lat[i] = dec - ing if dec > ing else 0
+            f = flags[i]
+            if f & FLAG_STALE:
+                stale += 1
+            if f & FLAG_ACCEPT:
+                accepted += 1
+        return lat, accepted, stale
+else:
+    def summarize(ts_decode, ts_ingress, flags):
+        """Latency column (clamped at 0) plus accepted/stale counts"""
+        lat = ts_decode - ts_ingress
+        lat[ts_decode <= ts_ingress] = 0  # Clamp wrapped (negative) deltas
+        accepted = np.count_nonzero(flags & FLAG_ACCEPT)
+        stale = np.count_nonzero(flags & FLAG_STALE)
+        return lat, accepted, stale
 
 def load_records(binary_file):
-    """Load all records"""
-    records = []
-    with open(binary_file, 'rb') as f:
-        while True:
-            data = f.read(RECORD_SIZE)
-            if len(data) < RECORD_SIZE:
-                break
-            records.append(parse_record(data))
-    return records
+    """Map all records as a read-only structured array (trailing partial record ignored)"""
+    count = Path(binary_file).stat().st_size // RECORD_SIZE
+    if count == 0:
+        return np.empty(0, dtype=RECORD_DTYPE)  # mmap cannot map an empty range
+    return np.memmap(binary_file, dtype=RECORD_DTYPE, mode='r', shape=(count,))
 
 def analyze_latency(records):
-    """Compute latency stats"""
-    latencies = [r['latency_ns'] for r in records]
-    if not latencies:
-        return None
+    """Compute latency stats directly from the structured record array
+    
+    Returns (stats, latencies), or (None, None) when there are no records.
+    """
+    if len(records) == 0:
+        return None, None
+    
+    lat_np, accepted, stale = summarize(
+        records['ts_decode'], records['ts_ingress'], records['flags'])
     
-    lat_np = np.array(latencies)
+    # One call partitions the data once for all quantiles
+    pcts = np.percentile(lat_np, PERCENTILES)
     
-    return {
-        'count': len(latencies),
+    stats = {
+        'count': len(lat_np),
         'min': np.min(lat_np),
-        'p10': np.percentile(lat_np, 10),
-        'p25': np.percentile(lat_np, 25),
-        'p50': np.percentile(lat_np, 50),
-        'p75': np.percentile(lat_np, 75),
-        'p90': np.percentile(lat_np, 90),
-        'p99': np.percentile(lat_np, 99),
-        'p99_9': np.percentile(lat_np, 99.9),
+        'p10': pcts[0],
+        'p25': pcts[1],
+        'p50': pcts[2],
+        'p75': pcts[3],
+        'p90': pcts[4],
+        'p99': pcts[5],
+        'p99_9': pcts[6],
         'max': np.max(lat_np),
         'mean': np.mean(lat_np),
         'std': np.std(lat_np),
+        'accepted': accepted,
+        'stale': stale,
     }
+    return stats, lat_np
 
 def print_report(records, stats):
     """Print analysis report"""
@@ -83,8 +127,8 @@ def print_report(records, stats):
     print(f"  Mean:   {stats['mean']:.1f} ns")
     print(f"  StdDev: {stats['std']:.1f} ns")
     
-    accepted = sum(1 for r in records if r['is_accepted'])
-    stale = sum(1 for r in records if r['is_stale'])
+    accepted = stats['accepted']
+    stale = stats['stale']
     
     print("\nRISK GATE:")
     print(f"  Accepted: {accepted} ({accepted*100/len(records):.1f}%)")
@@ -95,7 +139,7 @@ def print_report(records, stats):
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: analyze_records.py <binary_file>")
+        print("Usage: analyze_records.py <binary_file> [stats.csv]")
         return 1
     
     infile = Path(sys.argv[1])
@@ -106,23 +150,32 @@ def main():
     print(f"Loading {infile}...")
     records = load_records(infile)
     
-    if not records:
+    if len(records) == 0:
         print("No records found")
         return 1
     
     print(f"Loaded {len(records)} records")
     
-    stats = analyze_latency(records)
+    stats, latencies = analyze_latency(records)
     print_report(records, stats)
     
-    # Save CSV if requested
+    # Save CSV if requested, plus JSON stats and binary columns for tooling
     if len(sys.argv) > 2:
-        outfile = sys.argv[2]
+        outfile = Path(sys.argv[2])
+        csv = "metric,value\n" + "".join(f"{k},{v}\n" for k, v in stats.items())
         with open(outfile, 'w') as f:
-            f.write("metric,value\n")
-            for k, v in stats.items():
-                f.write(f"{k},{v}\n")
+            f.write(csv)
         print(f"\nSaved stats to {outfile}")
+        
+        json_file = outfile.with_name(outfile.name + '.json')
+        with open(json_file, 'w') as f:
+            json.dump({k: v.item() if isinstance(v, np.generic) else v
+                       for k, v in stats.items()}, f, indent=2)
+        print(f"Saved stats to {json_file}")
+        
+        npz_file = outfile.with_name(outfile.name + '.npz')
+        np.savez_compressed(npz_file, latencies=latencies, flags=records['flags'])
+        print(f"Saved latencies/flags to {npz_file}")
     
     return 0
 
@@ -7,6 +7,11 @@ Applies risk profiles to FPGA
 import sys
 import subprocess
 
+try:
+    from csr_access import CSRAccess
+except ImportError:
+    CSRAccess = None  # Standalone deployment: fall back to the csr_access.py CLI
+
 # CSR offsets
 PRICE_BAND_BPS  = 0x044
 TOKEN_RATE      = 0x048
@@ -41,10 +46,24 @@ PROFILES = {
     },
 }
 
-def write_csr(offset, value):
-    """Write CSR using csr_access.py"""
-    cmd = [sys.executable, 'csr_access.py', 'write', hex(offset), str(value)]
-    result = subprocess.run(cmd, capture_output=True, text=True)
+def write_csrs(pairs):
+    """Write a batch of (offset, value) CSRs through one BAR0 mapping"""
+    if CSRAccess is None:
+        return write_csrs_subprocess(pairs)
+    
+    try:
+        with CSRAccess() as csr:
+            csr.write_many(pairs)
+    except Exception as e:
+        print(f"Error writing CSRs: {e}", file=sys.stderr)
+        return False
+    return True
+
+def write_csrs_subprocess(pairs):
+    """Write a batch of (offset, value) CSRs with one csr_access.py call"""
+    cmd = [sys.executable, 'csr_access.py', '--no-verify', 'write_batch']
+    batch = ''.join(f"{hex(offset)} {value}\n" for offset, value in pairs)
+    result = subprocess.run(cmd, input=batch, capture_output=True, text=True)
     return result.returncode == 0
 
 def apply_profile(profile_name):
@@ -67,12 +86,12 @@ def apply_profile(profile_name):
     ]
     
     for name, offset, value in params:
-        print(f"{name:20s} = {value:8d} ... ", end='')
-        if write_csr(offset, value):
-            print("[OK]")
-        else:
-            print("[FAIL]")
-            return False
+        print(f"{name:20s} = {value:8d}")
+    
+    ok = write_csrs([(offset, value) for _, offset, value in params])
+    print(f"\nWriting {len(params)} registers ... {'[OK]' if ok else '[FAIL]'}")
+    if not ok:
+        return False
     
     return True
 
@@ -6,7 +6,7 @@ Low-level tool for debugging and configuration
 
 import sys
 import mmap
-import struct
+import argparse
 from pathlib import Path
 
 VFIO_DEVICE = "/dev/vfio/0"
@@ -16,6 +16,7 @@ class CSRAccess:
     def __init__(self, device_path=VFIO_DEVICE):
         self.fd = None
         self.bar0 = None
+        self.regs = None
         
         try:
             # Open VFIO device
@@ -29,39 +30,69 @@ class CSRAccess:
                 mmap.PROT_READ | mmap.PROT_WRITE
             )
             
+            # 32-bit view: each index is one aligned word load/store on the
+            # bus (csr_avalon ignores byteenable, so partial writes corrupt)
+            self.regs = memoryview(self.bar0).cast('I')
+            
             print(f"Opened {device_path}, mapped {BAR0_SIZE} bytes")
             
         except Exception as e:
             print(f"Error opening device: {e}")
+            if self.regs:
+                self.regs.release()
             if self.bar0:
                 self.bar0.close()
             if self.fd:
                 self.fd.close()
             raise
     
-    def __del__(self):
+    def close(self):
+        """Unmap BAR0 and close the device"""
+        if self.regs:
+            self.regs.release()
+            self.regs = None
         if self.bar0:
             self.bar0.close()
+            self.bar0 = None
         if self.fd:
             self.fd.close()
+            self.fd = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+    
+    def __del__(self):
+        self.close()
     
     def read_u32(self, offset):
         """Read 32-bit value from CSR"""
-        if offset + 4 > BAR0_SIZE:
-            raise ValueError(f"Offset {hex(offset)} out of range")
+        if offset < 0 or offset & 3 or offset + 4 > BAR0_SIZE:
+            raise ValueError(f"Offset {hex(offset)} out of range or unaligned")
         
-        self.bar0.seek(offset)
-        data = self.bar0.read(4)
-        return struct.unpack('<I', data)[0]
+        return self.regs[offset >> 2]
     
     def write_u32(self, offset, value):
         """Write 32-bit value to CSR"""
-        if offset + 4 > BAR0_SIZE:
-            raise ValueError(f"Offset {hex(offset)} out of range")
+        if offset < 0 or offset & 3 or offset + 4 > BAR0_SIZE:
+            raise ValueError(f"Offset {hex(offset)} out of range or unaligned")
         
-        self.bar0.seek(offset)
-        self.bar0.write(struct.pack('<I', value & 0xFFFFFFFF))
-        self.bar0.flush()
+        self.regs[offset >> 2] = value & 0xFFFFFFFF
+    
+    def barrier(self):
+        """Order preceding posted CSR writes by reading back a CSR
+        
+        A read cannot pass earlier posted writes on PCIe, so everything
+        written before it has reached the device when it returns.
+        """
+        self.regs[0]
+    
+    def write_many(self, pairs):
+        """Write a sequence of (offset, value) pairs"""
+        for offset, value in pairs:
+            self.write_u32(offset, value)
     
     def read_u64(self, offset):
         """Read 64-bit value from two consecutive CSRs"""
@@ -74,46 +105,96 @@ class CSRAccess:
         self.write_u32(offset, value & 0xFFFFFFFF)
         self.write_u32(offset + 4, (value >> 32) & 0xFFFFFFFF)
 
+def parse_pair(arg):
+    """Parse an '<offset>=<value>' argument"""
+    offset, sep, value = arg.partition('=')
+    if not sep:
+        raise ValueError(f"Expected <offset>=<value>, got '{arg}'")
+    return int(offset, 0), int(value, 0)
+
+def parse_batch(lines):
+    """Parse '<offset> <value>' or '<offset>=<value>' lines (blank and # lines skipped)"""
+    pairs = []
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if not line:
+            continue
+        if '=' in line:
+            pairs.append(parse_pair(line))
+        else:
+            fields = line.split()
+            if len(fields) != 2:
+                raise ValueError(f"Expected <offset> <value>, got '{line}'")
+            pairs.append((int(fields[0], 0), int(fields[1], 0)))
+    return pairs
+
+def verify(csr, pairs):
+    """Read back written CSRs and report each one"""
+    for offset, value in pairs:
+        readback = csr.read_u32(offset)
+        status = "OK" if readback == value else f"readback mismatch: {hex(readback)}"
+        print(f"Wrote {hex(value)} to {hex(offset)} ... {status}")
+
 def main():
-    if len(sys.argv) < 3:
-        print("Usage:")
-        print("  csr_access.py read <offset>")
-        print("  csr_access.py write <offset> <value>")
-        print()
-        print("Examples:")
-        print("  csr_access.py read 0x100")
-        print("  csr_access.py write 0x200 0x12345678")
-        return 1
+    parser = argparse.ArgumentParser(
+        description='Direct CSR register read/write via VFIO',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""examples:
+  csr_access.py read 0x100
+  csr_access.py write 0x200 0x12345678
+  csr_access.py writemany 0x044=100 0x048=1000
+  csr_access.py --no-verify write_batch < regs.txt"""
+    )
+    parser.add_argument('--no-verify', action='store_true',
+                       help='Skip the readback after writes (caller verifies)')
+    
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    
+    p = sub.add_parser('read', help='Read one CSR')
+    p.add_argument('offset', type=lambda x: int(x, 0))
+    
+    p = sub.add_parser('write', help='Write one CSR')
+    p.add_argument('offset', type=lambda x: int(x, 0))
+    p.add_argument('value', type=lambda x: int(x, 0))
+    
+    p = sub.add_parser('writemany', help='Write <offset>=<value> pairs')
+    p.add_argument('pairs', nargs='+', type=parse_pair, metavar='<offset>=<value>')
     
-    cmd = sys.argv[1].lower()
-    offset = int(sys.argv[2], 0)
+    sub.add_parser('write_batch', help="Write '<offset> <value>' lines from stdin")
+    
+    args = parser.parse_args()
     
     try:
+        if args.cmd == 'write_batch':
+            pairs = parse_batch(sys.stdin)
+        
         csr = CSRAccess()
         
-        if cmd == 'read':
-            value = csr.read_u32(offset)
-            print(f"{hex(offset)}: {hex(value)} ({value})")
-            
-        elif cmd == 'write':
-            if len(sys.argv) < 4:
-                print("Error: write requires a value")
-                return 1
+        if args.cmd == 'read':
+            value = csr.read_u32(args.offset)
+            print(f"{hex(args.offset)}: {hex(value)} ({value})")
             
-            value = int(sys.argv[3], 0)
-            csr.write_u32(offset, value)
-            print(f"Wrote {hex(value)} to {hex(offset)}")
+        elif args.cmd == 'write':
+            csr.write_u32(args.offset, args.value)
+            print(f"Wrote {hex(args.value)} to {hex(args.offset)}")
             
-            # Read back to verify
-            readback = csr.read_u32(offset)
-            if readback == value:
-                print("Verified OK")
-            else:
-                print(f"Warning: readback mismatch: {hex(readback)}")
+            if not args.no_verify:
+                # Read back to verify
+                readback = csr.read_u32(args.offset)
+                if readback == args.value:
+                    print("Verified OK")
+                else:
+                    print(f"Warning: readback mismatch: {hex(readback)}")
         
         else:
-            print(f"Unknown command: {cmd}")
-            return 1
+            if args.cmd == 'writemany':
+                pairs = args.pairs
+            csr.write_many(pairs)
+            
+            if args.no_verify:
+                print(f"Wrote {len(pairs)} registers")
+            else:
+                verify(csr, pairs)
             
     except Exception as e:
         print(f"Error: {e}")
@@ -8,6 +8,7 @@ import sys
 import struct
 import random
 import argparse
+from array import array
 from datetime import datetime, timedelta
 
 # ITCH 5.0 message types
@@ -18,13 +19,26 @@ MSG_REPLACE_ORDER = ord('U')
 MSG_EXECUTE_ORDER = ord('E')
 MSG_TRADE = ord('P')
 
+WRITE_BATCH_BYTES = 64 * 1024
+
 class ITCHGenerator:
-    def __init__(self, symbols):
+    # Message layouts: Add, Delete, Trade
+    _ADD = struct.Struct('>HQIQB8sII')
+    _DEL = struct.Struct('>HQIQ')
+    _TRD = struct.Struct('>HQIQB8sIQI')
+    MAX_MSG_SIZE = max(_ADD.size, _DEL.size, _TRD.size)
+    
+    _ADD_SHARES = (100, 200, 500, 1000)
+    _TRD_SHARES = (100, 200, 500)
+    
+    def __init__(self, symbols, seed=None):
         self.symbols = symbols
+        self.rng = random.Random(seed)  # Private stream: reproducible with --seed
+        self._sym_bytes = {s: self.pack_symbol(s) for s in symbols}
         self.sequence = 1
         self.timestamp_ns = 34200000000000  # 9:30 AM in nanoseconds
         self.order_id = 1000000
-        self.active_orders = {}  # symbol -> [order_ids]
+        self.active_orders = {s: array('Q') for s in symbols}  # symbol -> live order ids
         
     def next_timestamp(self, delta_us=100):
         """Advance timestamp by microseconds"""
@@ -35,46 +49,50 @@ class ITCHGenerator:
         """Pack symbol as 8-byte ASCII padded"""
         return symbol.ljust(8)[:8].encode('ascii')
     
-    def generate_add_order(self, symbol, buy=True):
-        """Generate Add Order message (type A)"""
+    def generate_add_order(self, buf, offset, symbol, buy=True):
+        """Pack Add Order message (type A) into buf; returns the end offset"""
         self.order_id += 1
         
-        # Random price around $150
-        price = int((150.0 + random.uniform(-5.0, 5.0)) * 10000)
-        shares = random.choice([100, 200, 500, 1000])
+        # Random price around $150 (+/- $5 in 0.0001 ticks)
+        rng = self.rng
+        price = 1450000 + rng.randrange(100000)
+        shares = self._ADD_SHARES[rng.getrandbits(2)]
         
         # Track order
-        if symbol not in self.active_orders:
-            self.active_orders[symbol] = []
         self.active_orders[symbol].append(self.order_id)
         
-        msg = struct.pack(
-            '>HQIQB8sI',
+        self._ADD.pack_into(
+            buf, offset,
             38,                          # Length (2 bytes)
             self.next_timestamp(),       # Timestamp (8 bytes)
             self.sequence,               # Sequence (4 bytes)
             self.order_id,               # Order ref (8 bytes)
             ord('B') if buy else ord('S'),  # Buy/Sell (1 byte)
-            self.pack_symbol(symbol),    # Symbol (8 bytes)
-            shares                       # Shares (4 bytes)
+            self._sym_bytes[symbol],     # Symbol (8 bytes)
+            shares,                      # Shares (4 bytes)
+            price                        # Price (4 bytes)
         )
         
-        # Add price (4 bytes)
-        msg += struct.pack('>I', price)
-        
         self.sequence += 1
-        return msg
+        return offset + self._ADD.size
     
-    def generate_delete_order(self, symbol):
-        """Generate Delete Order message (type D)"""
+    def generate_delete_order(self, buf, offset, symbol):
+        """Pack Delete Order message (type D) into buf; returns the end offset
+        
+        Nothing is written if the symbol has no live orders.
+        """
         if not self.active_orders.get(symbol):
-            return None
+            return offset
         
-        order_id = random.choice(self.active_orders[symbol])
-        self.active_orders[symbol].remove(order_id)
+        # Swap-pop a random live order: O(1) instead of list.remove's scan
+        orders = self.active_orders[symbol]
+        i = self.rng.randrange(len(orders))
+        order_id = orders[i]
+        orders[i] = orders[-1]
+        orders.pop()
         
-        msg = struct.pack(
-            '>HQIQ',
+        self._DEL.pack_into(
+            buf, offset,
             23,                     # Length
             self.next_timestamp(),
             self.sequence,
@@ -82,57 +100,70 @@ class ITCHGenerator:
         )
         
         self.sequence += 1
-        return msg
+        return offset + self._DEL.size
     
-    def generate_trade(self, symbol):
-        """Generate Trade message (type P)"""
-        price = int((150.0 + random.uniform(-2.0, 2.0)) * 10000)
-        shares = random.choice([100, 200, 500])
+    def generate_trade(self, buf, offset, symbol):
+        """Pack Trade message (type P) into buf; returns the end offset"""
+        rng = self.rng
+        price = 1480000 + rng.randrange(40000)  # $150 +/- 2
+        shares = self._TRD_SHARES[rng.randrange(3)]
         
-        msg = struct.pack(
-            '>HQIQB8sIQI',
+        self._TRD.pack_into(
+            buf, offset,
             44,                     # Length
             self.next_timestamp(),
             self.sequence,
             self.order_id,
             ord('B'),               # Buy
-            self.pack_symbol(symbol),
+            self._sym_bytes[symbol],
             shares,
             self.order_id + 1,      # Match number
             price
         )
         
         self.sequence += 1
-        return msg
+        return offset + self._TRD.size
     
-    def generate_random_message(self, symbol):
-        """Generate random message weighted by probability"""
-        r = random.random()
+    def generate_random_message(self, buf, offset, symbol):
+        """Pack random message weighted by probability; returns the end offset"""
+        r = self.rng.random()
         
         if r < 0.5:  # 50% adds
-            return self.generate_add_order(symbol, random.choice([True, False]))
+            return self.generate_add_order(buf, offset, symbol, self.rng.getrandbits(1))
         elif r < 0.8:  # 30% cancels
-            return self.generate_delete_order(symbol)
+            return self.generate_delete_order(buf, offset, symbol)
         else:  # 20% trades
-            return self.generate_trade(symbol)
+            return self.generate_trade(buf, offset, symbol)
 
-def generate_itch_file(output_file, symbols, message_count):
+def generate_itch_file(output_file, symbols, message_count, seed=None):
     """Generate ITCH binary file"""
-    gen = ITCHGenerator(symbols)
+    gen = ITCHGenerator(symbols, seed)
     
     with open(output_file, 'wb') as f:
         print(f"Generating {message_count} ITCH messages...")
         
+        # Pack into one reusable buffer, written out every WRITE_BATCH_BYTES
+        buf = bytearray(WRITE_BATCH_BYTES + gen.MAX_MSG_SIZE)
+        view = memoryview(buf)
+        offset = 0
+        
+        # Local bindings for the hot loop
+        choice = gen.rng.choice
+        generate = gen.generate_random_message
+        write = f.write
+        
         for i in range(message_count):
-            symbol = random.choice(symbols)
-            msg = gen.generate_random_message(symbol)
+            offset = generate(buf, offset, choice(symbols))
             
-            if msg:
-                f.write(msg)
+            if offset >= WRITE_BATCH_BYTES:
+                write(view[:offset])
+                offset = 0
             
             if (i + 1) % 1000 == 0:
                 print(f"  Generated {i+1}/{message_count} messages...", end='\r')
         
+        write(view[:offset])
+        
         print(f"\n✓ Generated {message_count} messages")
         print(f"  Sequence: {gen.sequence}")
         print(f"  Output: {output_file}")
@@ -144,9 +175,20 @@ def main():
                        help='Number of messages (default: 10000)')
     parser.add_argument('-s', '--symbols', default='AAPL,MSFT,GOOGL,AMZN,TSLA',
                        help='Comma-separated symbols (default: AAPL,MSFT,GOOGL,AMZN,TSLA)')
+    parser.add_argument('--seed', type=int, default=None,
+                       help='RNG seed for reproducible output (default: random)')
+    parser.add_argument('--vectorized', action='store_true',
+                       help='Generate with NumPy in bulk (much faster for large counts)')
     
     args = parser.parse_args()
     
+    if args.vectorized:
+        # NumPy/Numba are only loaded here; they dominate startup time
+        try:
+            from synthetic_itch_vectorized import generate_itch_file_vectorized
+        except ImportError as e:
+            parser.error(f'--vectorized requires NumPy ({e})')
+    
     symbols = [s.strip() for s in args.symbols.split(',')]
     
     print("ITCH 5.0 Synthetic Data Generator")
@@ -155,7 +197,10 @@ def main():
     print(f"Messages: {args.count}")
     print()
     
-    generate_itch_file(args.output, symbols, args.count)
+    if args.vectorized:
+        generate_itch_file_vectorized(args.output, symbols, args.count, args.seed)
+    else:
+        generate_itch_file(args.output, symbols, args.count, args.seed)
     
     # Show file size
     import os
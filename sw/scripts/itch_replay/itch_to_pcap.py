@@ -4,15 +4,25 @@ itch_to_pcap.py - Convert ITCH binary data to PCAP with full network headers
 Wraps ITCH messages in Ethernet/IP/UDP for replay to FPGA
 """
 
+import os
 import sys
+import mmap
 import struct
 import argparse
 from datetime import datetime
 
+try:
+    import numpy as np
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
 # Ethernet header (14 bytes)
 ETH_DST_MAC = bytes.fromhex('01005e000101')  # Multicast MAC
 ETH_SRC_MAC = bytes.fromhex('aabbccddeeff')
-ETH_TYPE_IP = 0x0800
+ETH_TYPE_IP = b'\x08\x00'
+ETH_HEADER = ETH_DST_MAC + ETH_SRC_MAC + ETH_TYPE_IP
 
 # IP header constants
 IP_VERSION = 4
@@ -24,32 +34,62 @@ IP_TTL = 64
 IP_PROTO_UDP = 17
 IP_SRC = '192.168.10.1'
 IP_DST = '239.0.1.1'  # Multicast
+IP_SRC_BYTES = bytes(int(x) for x in IP_SRC.split('.'))
+IP_DST_BYTES = bytes(int(x) for x in IP_DST.split('.'))
 
 # UDP header constants
 UDP_SRC_PORT = 12345
 UDP_DST_PORT = 20000
 
-def ip_checksum(data):
-    """Calculate IP header checksum"""
-    if len(data) % 2 == 1:
-        data += b'\x00'
+# Offsets of the per-packet fields in the 42-byte Ethernet+IP+UDP header
+IP_TOTAL_LEN_OFFSET = 14 + 2
+IP_CHECKSUM_OFFSET = 14 + 10
+UDP_LEN_OFFSET = 14 + 20 + 4
+
+# Largest UDP payload that fits the 16-bit IP total_len
+MAX_UDP_PAYLOAD = 0xffff - 20 - 8
+
+_U16BE = struct.Struct('!H')
+_PCAP_RECORD = struct.Struct('<IIII')
+
+# Output is batched in memory and written to an unbuffered file in chunks of
+# at least this size, so there is no extra copy through a BufferedWriter
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+def ip_header_partial_sum():
+    """Unfolded one's-complement sum of the constant IP header words
     
-    s = sum(struct.unpack('!%dH' % (len(data) // 2), data))
-    s = (s >> 16) + (s & 0xffff)
-    s += s >> 16
-    return ~s & 0xffff
+    Everything but total_len is fixed, so the per-packet checksum only has
+    to add total_len to this and fold.
+    """
+    header = struct.pack(
+        '!BBHHHBBH4s4s',
+        (IP_VERSION << 4) | IP_IHL,
+        IP_TOS,
+        0,  # total_len, added per packet
+        IP_ID,
+        IP_FLAGS_DF,
+        IP_TTL,
+        IP_PROTO_UDP,
+        0,  # Checksum
+        IP_SRC_BYTES,
+        IP_DST_BYTES
+    )
+    return sum(struct.unpack('!10H', header))
 
-def build_ethernet_header(dst_mac, src_mac):
-    """Build 14-byte Ethernet header"""
-    return dst_mac + src_mac + struct.pack('!H', ETH_TYPE_IP)
+IP_HEADER_PARTIAL_SUM = ip_header_partial_sum()
 
-def build_ip_header(payload_len, src_ip, dst_ip):
+def build_ip_header(payload_len):
     """Build 20-byte IP header"""
     total_len = 20 + 8 + payload_len  # IP + UDP + payload
     
-    # IP header without checksum
-    header = struct.pack(
-        '!BBHHHBBH',
+    # Incremental checksum: constant words + total_len
+    s = IP_HEADER_PARTIAL_SUM + total_len
+    s = (s >> 16) + (s & 0xffff)
+    s += s >> 16
+    
+    return struct.pack(
+        '!BBHHHBBH4s4s',
         (IP_VERSION << 4) | IP_IHL,  # Version + IHL
         IP_TOS,
         total_len,
@@ -57,19 +97,10 @@ def build_ip_header(payload_len, src_ip, dst_ip):
         IP_FLAGS_DF,
         IP_TTL,
         IP_PROTO_UDP,
-        0  # Checksum placeholder
+        ~s & 0xffff,
+        IP_SRC_BYTES,
+        IP_DST_BYTES
     )
-    
-    # Add source and dest IPs
-    header += struct.pack('!4s4s',
-                         bytes(map(int, src_ip.split('.'))),
-                         bytes(map(int, dst_ip.split('.'))))
-    
-    # Calculate and insert checksum
-    checksum = ip_checksum(header)
-    header = header[:10] + struct.pack('!H', checksum) + header[12:]
-    
-    return header
 
 def build_udp_header(payload_len, src_port, dst_port):
     """Build 8-byte UDP header"""
@@ -82,6 +113,20 @@ def build_udp_header(payload_len, src_port, dst_port):
         0  # Checksum (optional for IPv4)
     )
 
+def build_header_template(src_port=UDP_SRC_PORT, dst_port=UDP_DST_PORT):
+    """Build the Ethernet+IP+UDP header once; lengths/checksum patched per packet"""
+    return bytearray(ETH_HEADER + build_ip_header(0) + build_udp_header(0, src_port, dst_port))
+
+def patch_header_template(template, payload_len):
+    """Write IP total_len/checksum and UDP length for payload_len in place"""
+    total_len = 20 + 8 + payload_len
+    s = IP_HEADER_PARTIAL_SUM + total_len
+    s = (s >> 16) + (s & 0xffff)
+    s += s >> 16
+    _U16BE.pack_into(template, IP_TOTAL_LEN_OFFSET, total_len)
+    _U16BE.pack_into(template, IP_CHECKSUM_OFFSET, ~s & 0xffff)
+    _U16BE.pack_into(template, UDP_LEN_OFFSET, 8 + payload_len)
+
 def write_pcap_header(f):
     """Write PCAP global header"""
     f.write(struct.pack(
@@ -95,79 +140,225 @@ def write_pcap_header(f):
         1            # Link type (Ethernet)
     ))
 
-def write_pcap_packet(f, timestamp_sec, timestamp_usec, packet):
-    """Write PCAP packet header + data"""
-    packet_len = len(packet)
+def append_pcap_packet(buf, timestamp_sec, timestamp_usec, header, payload):
+    """Append PCAP packet header + data (network header, payload) to buf"""
+    packet_len = len(header) + len(payload)
     
-    f.write(struct.pack(
-        '<IIII',
+    buf += _PCAP_RECORD.pack(
         timestamp_sec,
         timestamp_usec,
         packet_len,
         packet_len
-    ))
-    f.write(packet)
+    )
+    buf += header
+    buf += payload
 
-def itch_to_pcap(itch_file, pcap_file, max_msgs_per_udp=20):
-    """Convert ITCH file to PCAP"""
-    
-    print(f"Converting {itch_file} → {pcap_file}")
-    print(f"Max messages per UDP datagram: {max_msgs_per_udp}")
-    print()
-    
-    with open(itch_file, 'rb') as fin, open(pcap_file, 'wb') as fout:
-        write_pcap_header(fout)
+def write_all(f, data):
+    """Write all of data to an unbuffered file (raw writes may be short)"""
+    view = memoryview(data)
+    while len(view):
+        view = view[f.write(view):]
+
+# _convert_kernel status codes
+_KERNEL_MORE = 0      # Output buffer full, call again from offset
+_KERNEL_DONE = 1
+_KERNEL_OVERSIZE = 2  # Datagram at offset exceeds MAX_UDP_PAYLOAD
+
+if HAVE_NUMBA:
+    @njit(cache=True)  # Reuse compiled kernel across runs
+    def _convert_kernel(data, offset, out, header, max_msgs, ts_sec, ts_usec):
+        """Frame messages from data[offset:] into PCAP records in out
         
-        packet_count = 0
-        message_count = 0
-        timestamp_sec = int(datetime.now().timestamp())
-        timestamp_usec = 0
+        Stops when the next packet would not fit. Returns (offset, out_len,
+        packets, messages, ts_sec, ts_usec, status); on _KERNEL_OVERSIZE,
+        offset is the start of the datagram that exceeds MAX_UDP_PAYLOAD.
+        """
+        size = data.size
+        pos = 0
+        packets = 0
+        messages = 0
         
         while True:
             # Accumulate multiple ITCH messages into one UDP datagram
-            udp_payload = b''
-            msgs_in_packet = 0
+            start = offset
+            end = offset
+            count = 0
+            while count < max_msgs and end + 2 <= size:
+                msg_len = (np.int64(data[end]) << 8) | np.int64(data[end + 1])
+                if msg_len < 2:
+                    raise ValueError("Invalid ITCH message length")
+                if end + msg_len > size:
+                    break  # Truncated message at end of file
+                end += msg_len
+                count += 1
             
-            while msgs_in_packet < max_msgs_per_udp:
-                # Read message length (2 bytes, big-endian)
-                length_bytes = fin.read(2)
-                if not length_bytes:
-                    break
-                
-                msg_len = struct.unpack('>H', length_bytes)[0]
-                
-                # Read rest of message
-                msg_data = fin.read(msg_len - 2)
-                if len(msg_data) != msg_len - 2:
-                    break
-                
-                # Add to UDP payload
-                udp_payload += length_bytes + msg_data
-                msgs_in_packet += 1
-                message_count += 1
+            payload_len = end - start
+            if payload_len == 0:
+                return size, pos, packets, messages, ts_sec, ts_usec, _KERNEL_DONE
+            if payload_len > MAX_UDP_PAYLOAD:
+                return start, pos, packets, messages, ts_sec, ts_usec, _KERNEL_OVERSIZE
             
-            if not udp_payload:
-                break
+            packet_len = header.size + payload_len
+            if pos + 16 + packet_len > out.size:
+                return start, pos, packets, messages, ts_sec, ts_usec, _KERNEL_MORE
+            
+            # PCAP record header (little-endian)
+            for i in range(4):
+                out[pos + i] = (ts_sec >> (8 * i)) & 0xff
+                out[pos + 4 + i] = (ts_usec >> (8 * i)) & 0xff
+                out[pos + 8 + i] = (packet_len >> (8 * i)) & 0xff
+                out[pos + 12 + i] = (packet_len >> (8 * i)) & 0xff
+            pos += 16
             
-            # Build packet: Ethernet + IP + UDP + ITCH messages
-            eth_header = build_ethernet_header(ETH_DST_MAC, ETH_SRC_MAC)
-            ip_header = build_ip_header(len(udp_payload), IP_SRC, IP_DST)
-            udp_header = build_udp_header(len(udp_payload), UDP_SRC_PORT, UDP_DST_PORT)
+            # Header template with lengths and incremental checksum patched
+            out[pos:pos + header.size] = header
+            total_len = 20 + 8 + payload_len
+            s = IP_HEADER_PARTIAL_SUM + total_len
+            s = (s >> 16) + (s & 0xffff)
+            s += s >> 16
+            s = ~s & 0xffff
+            udp_len = 8 + payload_len
+            out[pos + IP_TOTAL_LEN_OFFSET] = total_len >> 8
+            out[pos + IP_TOTAL_LEN_OFFSET + 1] = total_len & 0xff
+            out[pos + IP_CHECKSUM_OFFSET] = s >> 8
+            out[pos + IP_CHECKSUM_OFFSET + 1] = s & 0xff
+            out[pos + UDP_LEN_OFFSET] = udp_len >> 8
+            out[pos + UDP_LEN_OFFSET + 1] = udp_len & 0xff
+            pos += header.size
             
-            packet = eth_header + ip_header + udp_header + udp_payload
+            out[pos:pos + payload_len] = data[start:end]
+            pos += payload_len
             
-            # Write to PCAP
-            write_pcap_packet(fout, timestamp_sec, timestamp_usec, packet)
-            packet_count += 1
+            offset = end
+            packets += 1
+            messages += count
             
             # Advance timestamp (10 microseconds per packet)
-            timestamp_usec += 10
-            if timestamp_usec >= 1000000:
-                timestamp_sec += 1
-                timestamp_usec = 0
+            ts_usec += 10
+            if ts_usec >= 1000000:
+                ts_sec += 1
+                ts_usec = 0
+
+def convert_numba(data, fout, max_msgs_per_udp, timestamp_sec):
+    """JIT-compiled conversion of a uint8 array; returns (packet_count, message_count)"""
+    header = np.frombuffer(build_header_template(), dtype=np.uint8)
+    
+    # Large enough for at least one maximum-size (IP-limited) packet
+    out = np.empty(max(OUTPUT_BUFFER_SIZE, 16 + header.size + MAX_UDP_PAYLOAD), dtype=np.uint8)
+    
+    offset = 0
+    packet_count = 0
+    message_count = 0
+    timestamp_usec = 0
+    status = _KERNEL_MORE
+    
+    while status == _KERNEL_MORE:
+        (offset, out_len, packets, messages,
+         timestamp_sec, timestamp_usec, status) = _convert_kernel(
+            data, offset, out, header, max_msgs_per_udp, timestamp_sec, timestamp_usec)
+        write_all(fout, out[:out_len])
+        packet_count += packets
+        message_count += messages
+        print(f"  Packets: {packet_count}, Messages: {message_count}", end='\r')
+    
+    if status == _KERNEL_OVERSIZE:
+        raise ValueError(f"UDP payload starting at offset {offset} exceeds "
+                         f"{MAX_UDP_PAYLOAD} bytes; lower --max-msgs")
+    
+    return packet_count, message_count
+
+def convert_python(data, fout, max_msgs_per_udp, timestamp_sec):
+    """Pure-Python conversion; returns (packet_count, message_count)"""
+    size = len(data)
+    packet_count = 0
+    message_count = 0
+    timestamp_usec = 0
+    offset = 0
+    
+    # Ethernet/IP/UDP header: 38 of 42 bytes are the same for every packet
+    header = build_header_template()
+    out = bytearray()
+    
+    while True:
+        # Accumulate multiple ITCH messages into one UDP datagram
+        udp_payload = bytearray()
+        msgs_in_packet = 0
+        
+        while msgs_in_packet < max_msgs_per_udp:
+            # Message length (2 bytes, big-endian, includes itself)
+            if offset + 2 > size:
+                offset = size
+                break
+            
+            msg_len = _U16BE.unpack_from(data, offset)[0]
+            if msg_len < 2:
+                raise ValueError(f"Invalid ITCH message length {msg_len} at offset {offset}")
+            
+            end = offset + msg_len
+            if end > size:
+                offset = size  # Truncated message at end of file
+                break
             
-            if packet_count % 1000 == 0:
-                print(f"  Packets: {packet_count}, Messages: {message_count}", end='\r')
+            # Add to UDP payload
+            udp_payload += data[offset:end]
+            offset = end
+            msgs_in_packet += 1
+            message_count += 1
+        
+        if not udp_payload:
+            break
+        if len(udp_payload) > MAX_UDP_PAYLOAD:
+            raise ValueError(f"UDP payload starting at offset {offset - len(udp_payload)} "
+                             f"exceeds {MAX_UDP_PAYLOAD} bytes; lower --max-msgs")
+        
+        # Build packet: Ethernet + IP + UDP + ITCH messages
+        patch_header_template(header, len(udp_payload))
+        append_pcap_packet(out, timestamp_sec, timestamp_usec, header, udp_payload)
+        packet_count += 1
+        
+        if len(out) >= OUTPUT_BUFFER_SIZE:
+            write_all(fout, out)
+            out.clear()
+        
+        # Advance timestamp (10 microseconds per packet)
+        timestamp_usec += 10
+        if timestamp_usec >= 1000000:
+            timestamp_sec += 1
+            timestamp_usec = 0
+        
+        if packet_count % 1000 == 0:
+            print(f"  Packets: {packet_count}, Messages: {message_count}", end='\r')
+    
+    write_all(fout, out)
+    return packet_count, message_count
+
+def itch_to_pcap(itch_file, pcap_file, max_msgs_per_udp=20, use_numba=HAVE_NUMBA):
+    """Convert ITCH file to PCAP"""
+    
+    print(f"Converting {itch_file} → {pcap_file}")
+    print(f"Max messages per UDP datagram: {max_msgs_per_udp}")
+    print()
+    
+    with open(itch_file, 'rb') as fin, open(pcap_file, 'wb', buffering=0) as fout:
+        write_pcap_header(fout)
+        
+        timestamp_sec = int(datetime.now().timestamp())
+        
+        # Map the whole input (mmap rejects empty files)
+        size = os.fstat(fin.fileno()).st_size
+        if use_numba:
+            # np.memmap unmaps on garbage collection, which also covers the
+            # argument references Numba holds on to while compiling
+            data = np.memmap(fin, dtype=np.uint8, mode='r') if size else np.empty(0, dtype=np.uint8)
+            packet_count, message_count = convert_numba(data, fout, max_msgs_per_udp, timestamp_sec)
+        else:
+            mm = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+            try:
+                with memoryview(mm) as mv:
+                    packet_count, message_count = convert_python(mv, fout, max_msgs_per_udp, timestamp_sec)
+            finally:
+                if size:
+                    mm.close()
         
         print(f"\n✓ Conversion complete")
         print(f"  Total packets: {packet_count}")
@@ -182,11 +373,14 @@ def main():
     parser.add_argument('output', help='Output PCAP file')
     parser.add_argument('-m', '--max-msgs', type=int, default=20,
                        help='Max ITCH messages per UDP packet (default: 20)')
+    parser.add_argument('--no-numba', action='store_true',
+                       help='Use the pure-Python conversion loop even if Numba is installed')
     
     args = parser.parse_args()
     
     try:
-        itch_to_pcap(args.input, args.output, args.max_msgs)
+        itch_to_pcap(args.input, args.output, args.max_msgs,
+                     use_numba=HAVE_NUMBA and not args.no_numba)
     except Exception as e:
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
@@ -0,0 +1,185 @@
+"""
+synthetic_itch_vectorized.py - NumPy bulk backend for generate_synthetic_itch.py
+Imported only for --vectorized so the default path does not pay for NumPy/Numba
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+CHUNK_MESSAGES = 65536  # Messages per vectorized chunk (bounds memory for any --count)
+
+# Record layouts for the vectorized generator (same bytes as the struct.pack path)
+ADD_DTYPE = np.dtype([('len', '>u2'), ('ts', '>u8'), ('seq', '>u4'), ('oid', '>u8'),
+                      ('side', 'u1'), ('sym', 'S8'), ('shares', '>u4'), ('price', '>u4')])
+DEL_DTYPE = np.dtype([('len', '>u2'), ('ts', '>u8'), ('seq', '>u4'), ('oid', '>u8')])
+TRD_DTYPE = np.dtype([('len', '>u2'), ('ts', '>u8'), ('seq', '>u4'), ('oid', '>u8'),
+                      ('side', 'u1'), ('sym', 'S8'), ('shares', '>u4'), ('match', '>u8'),
+                      ('price', '>u4')])
+
+def _interleave_numpy(out, is_add, is_del, add, dele, trd):
+    """Scatter encoded record rows back into message order; returns bytes written"""
+    size = np.where(is_add, add.shape[1], np.where(is_del, dele.shape[1], trd.shape[1]))
+    offset = np.cumsum(size) - size
+    is_trd = ~(is_add | is_del)
+    for rows, mask in ((add, is_add), (dele, is_del), (trd, is_trd)):
+        out[offset[mask][:, None] + np.arange(rows.shape[1])] = rows
+    return int(size.sum())
+
+if HAVE_NUMBA:
+    @njit(cache=True)  # Reuse compiled kernel across runs
+    def _interleave(out, is_add, is_del, add, dele, trd):
+        """Copy encoded record rows back into message order; returns bytes written"""
+        pos = 0
+        a = 0
+        d = 0
+        t = 0
+        for i in range(is_add.size):
+            if is_add[i]:
+                rec = add[a]
+                a += 1
+            elif is_del[i]:
+                rec = dele[d]
+                d += 1
+            else:
+                rec = trd[t]
+                t += 1
+            out[pos:pos + rec.size] = rec
+            pos += rec.size
+        return pos
+else:
+    _interleave = _interleave_numpy
+
+class VectorizedITCHGenerator:
+    """NumPy counterpart of ITCHGenerator that builds messages in bulk
+    
+    Same message mix, layouts and sequence/timestamp/order-id numbering as
+    ITCHGenerator. Cancels retire the symbol's oldest live order (FIFO)
+    rather than a random one, which keeps them vectorizable.
+    """
+    
+    def __init__(self, symbols, rng=None, chunk_size=CHUNK_MESSAGES):
+        self.symbols = symbols
+        self.sym_bytes = np.array([s.ljust(8)[:8].encode('ascii') for s in symbols], dtype='S8')
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.sequence = 1
+        self.timestamp_ns = 34200000000000  # 9:30 AM in nanoseconds
+        self.order_id = 1000000
+        self.live_orders = [np.empty(0, dtype=np.uint64) for _ in symbols]  # FIFO per symbol
+        
+        # Per-chunk record and output buffers, allocated once and reused
+        self.chunk_size = chunk_size
+        self._add = np.empty(chunk_size, dtype=ADD_DTYPE)
+        self._del = np.empty(chunk_size, dtype=DEL_DTYPE)
+        self._trd = np.empty(chunk_size, dtype=TRD_DTYPE)
+        self._out = np.empty(chunk_size * max(ADD_DTYPE.itemsize, DEL_DTYPE.itemsize,
+                                              TRD_DTYPE.itemsize), dtype=np.uint8)
+        
+        # Constant columns are written once here, not per chunk
+        self._add['len'] = 38
+        self._del['len'] = 23
+        self._trd['len'] = 44
+        self._trd['side'] = ord('B')
+    
+    def _match_deletes(self, sym, is_add, is_del, oid):
+        """Resolve delete targets; returns (emitted mask, delete order ids)
+        
+        Per symbol the live-order count is a +1/-1 walk clamped at zero; a
+        delete is only emitted when the count before it is positive.
+        """
+        emit = ~is_del
+        del_oid = np.zeros(len(sym), dtype=np.uint64)
+        
+        for s in range(len(self.symbols)):
+            pos = np.flatnonzero((sym == s) & (is_add | is_del))
+            if len(pos) == 0:
+                continue
+            adds = is_add[pos]
+            walk = len(self.live_orders[s]) + np.cumsum(np.where(adds, 1, -1))
+            live = walk - np.minimum(np.minimum.accumulate(walk), 0)
+            live_before = np.concatenate(([len(self.live_orders[s])], live[:-1]))
+            hit = ~adds & (live_before > 0)
+            
+            queue = np.concatenate((self.live_orders[s], oid[pos[adds]]))
+            n_hit = np.count_nonzero(hit)
+            del_oid[pos[hit]] = queue[:n_hit]
+            emit[pos[hit]] = True
+            self.live_orders[s] = queue[n_hit:]
+        
+        return emit, del_oid
+    
+    def generate(self, count):
+        """Generate up to chunk_size random messages
+        
+        Returns the encoded bytes as a uint8 view of an internal buffer,
+        valid until the next call.
+        """
+        if count > self.chunk_size:
+            raise ValueError(f"count {count} exceeds chunk size {self.chunk_size}")
+        rng = self.rng
+        
+        sym = rng.integers(0, len(self.symbols), count)
+        r = rng.random(count)
+        is_add = r < 0.5                   # 50% adds
+        is_del = (r >= 0.5) & (r < 0.8)    # 30% cancels
+        
+        # Adds take the next order id; trades reference the latest one
+        oid = self.order_id + np.cumsum(is_add).astype(np.uint64)
+        self.order_id += int(np.count_nonzero(is_add))
+        
+        emit, del_oid = self._match_deletes(sym, is_add, is_del, oid)
+        sym, is_add, is_del, oid, del_oid = sym[emit], is_add[emit], is_del[emit], oid[emit], del_oid[emit]
+        is_trd = ~(is_add | is_del)
+        n = len(sym)
+        
+        seq = self.sequence + np.arange(n, dtype=np.uint64)
+        ts = self.timestamp_ns + 100000 * np.arange(1, n + 1, dtype=np.uint64)
+        self.sequence += n
+        self.timestamp_ns += 100000 * n
+        
+        add = self._add[:np.count_nonzero(is_add)]
+        add['ts'] = ts[is_add]
+        add['seq'] = seq[is_add]
+        add['oid'] = oid[is_add]
+        add['side'] = np.where(rng.integers(0, 2, len(add)) == 1, ord('B'), ord('S'))
+        add['sym'] = self.sym_bytes[sym[is_add]]
+        add['shares'] = rng.choice([100, 200, 500, 1000], len(add))
+        add['price'] = rng.integers(1450000, 1550000, len(add))  # $150 +/- 5
+        
+        dele = self._del[:np.count_nonzero(is_del)]
+        dele['ts'] = ts[is_del]
+        dele['seq'] = seq[is_del]
+        dele['oid'] = del_oid[is_del]
+        
+        trd = self._trd[:np.count_nonzero(is_trd)]
+        trd['ts'] = ts[is_trd]
+        trd['seq'] = seq[is_trd]
+        trd['oid'] = oid[is_trd]
+        trd['sym'] = self.sym_bytes[sym[is_trd]]
+        trd['shares'] = rng.choice([100, 200, 500], len(trd))
+        trd['match'] = oid[is_trd] + 1
+        trd['price'] = rng.integers(1480000, 1520000, len(trd))  # $150 +/- 2
+        
+        # Interleave the three record types back into message order
+        rows = [r.view(np.uint8).reshape(-1, r.dtype.itemsize) for r in (add, dele, trd)]
+        return self._out[:_interleave(self._out, is_add, is_del, *rows)]
+
+def generate_itch_file_vectorized(output_file, symbols, message_count, seed=None):
+    """Generate ITCH binary file with NumPy"""
+    gen = VectorizedITCHGenerator(symbols, np.random.default_rng(seed))
+    
+    with open(output_file, 'wb') as f:
+        print(f"Generating {message_count} ITCH messages (vectorized)...")
+        
+        for start in range(0, message_count, gen.chunk_size):
+            count = min(gen.chunk_size, message_count - start)
+            gen.generate(count).tofile(f)
+            print(f"  Generated {start + count}/{message_count} messages...", end='\r')
+        
+        print(f"\n✓ Generated {message_count} messages")
+        print(f"  Sequence: {gen.sequence}")
+        print(f"  Output: {output_file}")
@@ -6,44 +6,36 @@ Reads symbols.csv and programs the CAM via CSR registers
 
 import sys
 import csv
-import subprocess
+import struct
 from pathlib import Path
 
+from csr_access import CSRAccess
+
 # CSR offsets for symbol table
 SYMTAB_WR_INDEX  = 0x400
 SYMTAB_WR_SYMBOL_LOW  = 0x404
 SYMTAB_WR_SYMBOL_HIGH = 0x408
 SYMTAB_WR_ENABLE = 0x40C
 
-def symbol_to_u64(symbol_str):
-    """Convert 8-byte ASCII symbol to 64-bit integer"""
-    symbol_bytes = symbol_str.ljust(8)[:8].encode('ascii')
-    return int.from_bytes(symbol_bytes, byteorder='little')
-
-def write_csr(offset, value):
-    """Write CSR using csr_access.py"""
-    cmd = [sys.executable, 'csr_access.py', 'write', hex(offset), str(value)]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    return result.returncode == 0
+# 8-byte ASCII symbol as little-endian low/high words
+_SYM = struct.Struct('<II')
 
-def load_symbol(index, symbol):
+def load_symbol(csr, index, symbol):
     """Load one symbol into CAM"""
-    symbol_u64 = symbol_to_u64(symbol)
-    low = symbol_u64 & 0xFFFFFFFF
-    high = (symbol_u64 >> 32) & 0xFFFFFFFF
+    low, high = _SYM.unpack(symbol.ljust(8)[:8].encode('ascii'))
     
-    if not write_csr(SYMTAB_WR_INDEX, index):
-        return False
-    if not write_csr(SYMTAB_WR_SYMBOL_LOW, low):
-        return False
-    if not write_csr(SYMTAB_WR_SYMBOL_HIGH, high):
-        return False
-    if not write_csr(SYMTAB_WR_ENABLE, 1):
-        return False
-    if not write_csr(SYMTAB_WR_ENABLE, 0):
-        return False
+    csr.write_many([
+        (SYMTAB_WR_INDEX, index),
+        (SYMTAB_WR_SYMBOL_LOW, low),
+        (SYMTAB_WR_SYMBOL_HIGH, high),
+    ])
     
-    return True
+    # Entry must be in place before the write strobe
+    csr.barrier()
+    csr.write_many([
+        (SYMTAB_WR_ENABLE, 1),
+        (SYMTAB_WR_ENABLE, 0),
+    ])
 
 def load_from_csv(csv_path):
     """Load all symbols from CSV"""
@@ -51,8 +43,13 @@ def load_from_csv(csv_path):
         print(f"Error: {csv_path} not found")
         return False
     
+    try:
+        csr = CSRAccess()
+    except Exception:
+        return False  # CSRAccess has already reported the error
+    
     count = 0
-    with open(csv_path, 'r') as f:
+    with csr, open(csv_path, 'r') as f:
         reader = csv.DictReader(f)
         for row in reader:
             symbol = row['symbol'].strip()
@@ -60,12 +57,13 @@ def load_from_csv(csv_path):
             
             print(f"Loading {index:4d}: {symbol:8s} ", end='')
             
-            if load_symbol(index, symbol):
-                print("[OK]")
-                count += 1
-            else:
-                print("[FAIL]")
+            try:
+                load_symbol(csr, index, symbol)
+            except Exception as e:
+                print(f"[FAIL] {e}")
                 return False
+            print("[OK]")
+            count += 1
     
     print(f"\nLoaded {count} symbols")
     return True